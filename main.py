@@ -1,8 +1,16 @@
 import asyncio
+import gc
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from telethon import TelegramClient, events
 from dotenv import load_dotenv
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and unavailable on Windows
+    uvloop = None
+
 from src.config import Config
 from src.logger import setup_logger
 from src.task_manager import TaskManager
@@ -21,6 +29,8 @@ class TelegramUserbot:
         self.task_manager = TaskManager(
             max_downloads=config.MAX_CONCURRENT_DOWNLOADS,
             max_uploads=config.MAX_CONCURRENT_UPLOADS,
+            max_queued_downloads=config.MAX_QUEUED_DOWNLOADS,
+            max_queued_uploads=config.MAX_QUEUED_UPLOADS,
             logger=self.logger,
         )
         self.handlers = CommandHandlers(
@@ -29,18 +39,29 @@ class TelegramUserbot:
         self._register_handlers()
 
     def _register_handlers(self):
-        """Register command handlers"""
-        handlers = [
-            (r"^/upload", self.handlers.handle_upload),
-            (r"^/download", self.handlers.handle_download),
-            (r"^/status", self.handlers.handle_status),
-            (r"^/id", self.handlers.handle_id),
-            (r"^/logs", self.handlers.handle_logs),
-            (r"^/help", self.handlers.handle_help),
-        ]
-
-        for pattern, handler in handlers:
-            self.client.on(events.NewMessage(outgoing=True, pattern=pattern))(handler)
+        """Register a single dispatcher for all commands"""
+        self._commands = {
+            "/upload": self.handlers.handle_upload,
+            "/download": self.handlers.handle_download,
+            "/status": self.handlers.handle_status,
+            "/limits": self.handlers.handle_limits,
+            "/id": self.handlers.handle_id,
+            "/logs": self.handlers.handle_logs,
+            "/help": self.handlers.handle_help,
+        }
+
+        self.client.on(events.NewMessage(outgoing=True))(self._dispatch)
+
+    async def _dispatch(self, event):
+        """Route an outgoing command message to its handler"""
+        text = event.raw_text
+        if not text or text[0] != "/":
+            return
+
+        command = text[:16].split(maxsplit=1)[0].lower()
+        handler = self._commands.get(command)
+        if handler:
+            await handler(event)
 
     async def start(self):
         """Start the userbot"""
@@ -48,6 +69,20 @@ class TelegramUserbot:
         self.logger.info("🚀 TELEGRAM USERBOT STARTING")
         self.logger.info("=" * 60)
 
+        # Dedicated default executor for file I/O offloads
+        executor = ThreadPoolExecutor(
+            max_workers=self.config.THREAD_POOL_SIZE, thread_name_prefix="fm"
+        )
+        asyncio.get_running_loop().set_default_executor(executor)
+
+        try:
+            async with self.task_manager:
+                await self._run()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self):
+        """Connect and serve until disconnected"""
         await self.client.start()
 
         me = await self.client.get_me()
@@ -65,10 +100,19 @@ class TelegramUserbot:
         await self.client.run_until_disconnected()
 
 
+def tune_runtime():
+    """Tune interpreter settings for the long-running event loop"""
+    # Asyncio allocates many short-lived frames; collect young gen less often
+    gc.set_threshold(50_000, 10, 10)
+    # Don't record coroutine creation stacks even if dev mode enabled them
+    sys.set_coroutine_origin_tracking_depth(0)
+
+
 async def main():
     """Application entry point"""
     try:
         config = Config()
+        config.create_directories()
         bot = TelegramUserbot(config)
         await bot.start()
     except KeyboardInterrupt:
@@ -79,4 +123,7 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    tune_runtime()
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(main(), debug=False)
@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import Tuple
+from typing import FrozenSet
 
 
 @dataclass
@@ -23,28 +23,50 @@ class Config:
     FFMPEG_TIMEOUT: int = 120
     THUMBNAIL_TIME: str = "00:00:05"
     THUMBNAIL_QUALITY: int = 3
+    # Re-encode HEVC/VP9/AV1 (or non-AAC/MP3 audio) instead of remuxing as-is;
+    # off by default since a transcode is CPU-bound and can take most of an hour
+    TRANSCODE_INCOMPATIBLE: bool = field(
+        default_factory=lambda: os.getenv("TRANSCODE_INCOMPATIBLE", "").lower()
+        in ("1", "true", "yes")
+    )
+    FFMPEG_PRESET: str = "veryfast"  # libx264 preset for software transcodes
+    FFMPEG_CRF: int = 23
+    FFMPEG_TRANSCODE_TIMEOUT: int = 3600  # re-encoding runs at roughly playback speed
 
     # Download/Upload settings
     DOWNLOAD_TIMEOUT: int = 3600
+    DOWNLOAD_BUFFER_SIZE: int = 4 * 1024 * 1024
     PROGRESS_UPDATE_INTERVAL: float = 15.0
 
+    # File operations: unlink inline on local disk (a thread handoff costs more
+    # than the syscall); enable offloading when DOWNLOAD_DIR is on NFS/FUSE
+    OFFLOAD_FS_OPS: bool = field(
+        default_factory=lambda: os.getenv("OFFLOAD_FS_OPS", "").lower()
+        in ("1", "true", "yes")
+    )
+    THREAD_POOL_SIZE: int = field(
+        default_factory=lambda: int(os.getenv("THREAD_POOL_SIZE") or "16")
+    )
+
     # Concurrency limits
     MAX_CONCURRENT_DOWNLOADS: int = 3
     MAX_CONCURRENT_UPLOADS: int = 2
+    MAX_QUEUED_DOWNLOADS: int = 10
+    MAX_QUEUED_UPLOADS: int = 10
+    MAX_CONCURRENCY_LIMIT: int = 16  # upper bound accepted by /limits
+
+    # Telegram message edit rate limit (token bucket)
+    EDIT_RATE: float = 25.0
+    EDIT_BURST: int = 30
 
     # Supported formats
-    VIDEO_EXTENSIONS: Tuple[str, ...] = (
-        ".mp4",
-        ".mov",
-        ".avi",
-        ".mkv",
-        ".flv",
-        ".webm",
+    # Lowercase with leading dot, matched against Path.suffix.lower()
+    VIDEO_EXTENSIONS: FrozenSet[str] = frozenset(
+        {".mp4", ".mov", ".avi", ".mkv", ".flv", ".webm"}
     )
-    VIDEO_FORMATS: Tuple[str, ...] = ("mp4", "mov", "avi", "matroska", "webm", "flv")
 
     def __post_init__(self):
-        """Validate configuration and create directories"""
+        """Validate configuration and resolve paths"""
         self._validate()
         self._setup_paths()
 
@@ -56,6 +78,10 @@ class Config:
             raise ValueError("API_HASH is required")
 
     def _setup_paths(self):
-        """Setup and create necessary directories"""
-        self.download_path = Path(self.DOWNLOAD_DIR)
+        """Resolve directory paths without touching the filesystem"""
+        self.download_dir_str = os.path.abspath(self.DOWNLOAD_DIR)
+        self.download_path = Path(self.download_dir_str)
+
+    def create_directories(self):
+        """Create necessary directories (call once at startup)"""
         self.download_path.mkdir(parents=True, exist_ok=True)
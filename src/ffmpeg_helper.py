@@ -1,11 +1,283 @@
 import asyncio
 import json
 import logging
+import os
+import shutil
+import struct
+from contextlib import suppress
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
+from src.config import Config
 from src.utils import humanbytes
 
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional, stdlib json also accepts bytes
+    json_loads = json.loads
+
+try:
+    import av
+except ImportError:  # PyAV is optional, ffprobe subprocess is used without it
+    av = None
+
+
+# StreamReader buffer for subprocess pipes, large enough for ffprobe JSON
+_STREAM_LIMIT = 1 << 20
+
+# Only the fields read by callers; skips tags, side data and dispositions
+_PROBE_ENTRIES = (
+    "format=format_name,duration:stream=codec_type,codec_name,width,height,duration"
+)
+
+# Codecs Telegram streams from MP4 as-is; anything else needs transcoding
+_COPY_VIDEO_CODECS = frozenset({"h264"})
+_COPY_AUDIO_CODECS = frozenset({"aac", "mp3"})
+
+# ffprobe's format_name for the MP4 files written by optimize_for_streaming
+_MP4_FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+
+# Hardware H.264 encoders in order of preference
+_HW_ENCODERS = ("h264_nvenc", "h264_vaapi", "h264_videotoolbox")
+_VAAPI_DEVICE = "/dev/dri/renderD128"
+
+
+@lru_cache(maxsize=None)
+def _binary(name: str) -> str:
+    """
+    Resolve an executable on PATH once per process
+
+    Args:
+        name: Executable name (e.g. "ffmpeg")
+
+    Returns:
+        Absolute path, or the bare name so exec still reports it missing
+    """
+    return shutil.which(name) or name
+
+
+def _drop_cached_pages(path: str) -> None:
+    """
+    Ask the kernel to drop a file's clean pages from the page cache
+
+    Best effort: a no-op where posix_fadvise is unavailable (e.g. macOS).
+
+    Args:
+        path: Path to a file that won't be read again
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass
+
+
+def _moov_before_mdat(path: str, max_boxes: int = 64) -> bool:
+    """
+    Walk top-level MP4/MOV boxes and report whether moov precedes mdat
+
+    Args:
+        path: Path to media file
+        max_boxes: Maximum number of top-level boxes to inspect
+
+    Returns:
+        True if the file is already laid out for streaming (faststart)
+    """
+    try:
+        with open(path, "rb") as f:
+            for _ in range(max_boxes):
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+
+                size, box_type = struct.unpack(">I4s", header)
+                if box_type == b"moov":
+                    return True
+                if box_type == b"mdat":
+                    return False
+
+                if size == 1:  # 64-bit largesize follows the header
+                    large = f.read(8)
+                    if len(large) < 8:
+                        return False
+                    skip = struct.unpack(">Q", large)[0] - 16
+                elif size == 0:  # box extends to end of file
+                    return False
+                else:
+                    skip = size - 8
+
+                if skip < 0:
+                    return False
+                f.seek(skip, os.SEEK_CUR)
+    except OSError:
+        return False
+
+    return False
+
+
+def _stream_codecs(data: dict) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Pick the first video and audio codec names from probe output
+
+    Args:
+        data: Probe dict with a "streams" list
+
+    Returns:
+        Tuple of (video_codec, audio_codec), None where the stream is absent
+    """
+    video_codec = audio_codec = None
+    for stream in data.get("streams", []):
+        codec_type = stream.get("codec_type")
+        if codec_type == "video" and video_codec is None:
+            video_codec = stream.get("codec_name")
+        elif codec_type == "audio" and audio_codec is None:
+            audio_codec = stream.get("codec_name")
+    return video_codec, audio_codec
+
+
+def _streaming_command(
+    input_str: str,
+    output_str: str,
+    video: bool,
+    audio: bool,
+    encoder: Optional[str],
+    preset: str = Config.FFMPEG_PRESET,
+    crf: int = Config.FFMPEG_CRF,
+) -> list:
+    """
+    Build the ffmpeg command that writes a faststart MP4
+
+    Streams are copied unless flagged for re-encoding.
+
+    Args:
+        input_str: Input file path
+        output_str: Output file path
+        video: Re-encode the video track to H.264
+        audio: Re-encode the audio track to AAC
+        encoder: Hardware H.264 encoder to use, None for libx264
+        preset: libx264 preset
+        crf: libx264 constant rate factor
+
+    Returns:
+        Command arguments list
+    """
+    input_args = ["-i", input_str]
+    codec_args = ["-c", "copy"]
+
+    # Every path outputs 8-bit 4:2:0: 10-bit sources (phone HDR HEVC) would
+    # otherwise become High 10 H.264, which Telegram clients can't play
+    if video and encoder == "h264_nvenc":
+        # Decoded frames come back to system memory so 10-bit input can be
+        # converted; h264_nvenc rejects p010 surfaces
+        input_args = ["-hwaccel", "cuda", "-i", input_str]
+        codec_args += ["-c:v", "h264_nvenc", "-preset", "p4"]
+        codec_args += ["-rc", "vbr", "-cq", "23", "-pix_fmt", "yuv420p"]
+    elif video and encoder == "h264_vaapi":
+        input_args = ["-vaapi_device", _VAAPI_DEVICE, "-i", input_str]
+        codec_args += ["-vf", "format=nv12,hwupload", "-c:v", "h264_vaapi"]
+    elif video and encoder == "h264_videotoolbox":
+        codec_args += ["-c:v", "h264_videotoolbox", "-pix_fmt", "yuv420p"]
+    elif video:
+        codec_args += ["-c:v", "libx264", "-preset", preset, "-crf", str(crf)]
+        codec_args += ["-pix_fmt", "yuv420p", "-profile:v", "high"]
+        codec_args += ["-threads", str(os.cpu_count() or 0)]
+
+    if audio:
+        codec_args += ["-c:a", "aac"]
+
+    return [
+        _binary("ffmpeg"),
+        "-y",
+        *input_args,
+        *codec_args,
+        "-movflags",
+        "+faststart",
+        "-f",
+        "mp4",
+        output_str,
+    ]
+
+
+def _encoder_test_command(encoder: str) -> list:
+    """
+    Build a one-frame test encode that fails without a usable device
+
+    Args:
+        encoder: Hardware H.264 encoder name
+
+    Returns:
+        Command arguments list
+    """
+    device_args = ["-vaapi_device", _VAAPI_DEVICE] if encoder == "h264_vaapi" else []
+    filter_args = ["-vf", "format=nv12,hwupload"] if encoder == "h264_vaapi" else []
+    return [
+        _binary("ffmpeg"),
+        "-hide_banner",
+        *device_args,
+        "-f",
+        "lavfi",
+        "-i",
+        "nullsrc=s=256x256",
+        *filter_args,
+        "-frames:v",
+        "1",
+        "-c:v",
+        encoder,
+        "-f",
+        "null",
+        "-",
+    ]
+
+
+def _probe_with_av(path: str) -> dict:
+    """
+    Probe a media file in-process with PyAV
+
+    Args:
+        path: Path to media file
+
+    Returns:
+        Dict shaped like ffprobe's "format"/"streams" JSON output
+    """
+    with av.open(path) as container:
+        container_duration = (
+            container.duration / av.time_base if container.duration else 0.0
+        )
+
+        streams = []
+        for stream in container.streams:
+            codec = stream.codec_context
+            info = {
+                "codec_type": stream.type,
+                # codec.name is the decoder (mp3float, libdav1d); ffprobe
+                # reports the codec id's name
+                "codec_name": codec.codec.canonical_name if codec else None,
+                "duration": str(
+                    float(stream.duration * stream.time_base)
+                    if stream.duration and stream.time_base
+                    else container_duration
+                ),
+            }
+            if stream.type == "video" and codec:
+                info["width"] = codec.width
+                info["height"] = codec.height
+            streams.append(info)
+
+        return {
+            "format": {
+                "format_name": container.format.name,
+                "duration": str(container_duration),
+            },
+            "streams": streams,
+        }
+
 
 class FFmpegError(Exception):
     """FFmpeg operation error"""
@@ -16,8 +288,38 @@ class FFmpegError(Exception):
 class FFmpegHelper:
     """Helper for FFmpeg operations"""
 
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    # Encoder detection runs once per process, shared by all helpers
+    _hw_encoder: Optional[str] = None
+    _hw_detected: bool = False
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        force_transcode: bool = False,
+        transcode_incompatible: bool = False,
+        preset: str = Config.FFMPEG_PRESET,
+        crf: int = Config.FFMPEG_CRF,
+        transcode_timeout: int = Config.FFMPEG_TRANSCODE_TIMEOUT,
+    ):
+        """
+        Initialize FFmpeg helper
+
+        Args:
+            logger: Optional logger instance
+            force_transcode: Re-encode even when streams could be copied
+            transcode_incompatible: Re-encode tracks Telegram can't stream;
+                when False every file is remuxed with stream copy
+            preset: libx264 preset for software transcodes
+            crf: libx264 constant rate factor for software transcodes
+            transcode_timeout: Timeout in seconds for runs that re-encode
+        """
         self.logger = logger or logging.getLogger(__name__)
+        self.force_transcode = force_transcode
+        self.transcode_incompatible = transcode_incompatible
+        self.preset = preset
+        self.crf = crf
+        self.transcode_timeout = transcode_timeout
+        self._probe_cache: Dict[Tuple[str, int, int], dict] = {}
 
     async def _run_command(
         self,
@@ -40,19 +342,22 @@ class FFmpegHelper:
             FFmpegError: On execution failure
         """
         try:
-            self.logger.debug(f"Executing: {' '.join(command)}")
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("Executing: %s", " ".join(command))
 
             proc = await asyncio.create_subprocess_exec(
                 *command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
+                # Our fds are non-inheritable (PEP 446), skip the close scan
+                close_fds=False,
+                limit=_STREAM_LIMIT,
             )
 
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    proc.communicate(), timeout=timeout
-                )
-            except asyncio.TimeoutError:
+                async with asyncio.timeout(timeout):
+                    stdout, stderr = await proc.communicate()
+            except TimeoutError:
                 proc.kill()
                 raise FFmpegError(f"{description} timeout after {timeout}s")
 
@@ -60,7 +365,7 @@ class FFmpegHelper:
                 error = stderr.decode("utf-8", errors="ignore")[:500]
                 raise FFmpegError(f"{description} failed: {error}")
 
-            self.logger.debug(f"{description} completed")
+            self.logger.debug("%s completed", description)
             return stdout
 
         except FileNotFoundError:
@@ -70,36 +375,101 @@ class FFmpegHelper:
                 raise FFmpegError(f"{description} error: {e}")
             raise
 
-    async def check_if_video(self, file_path: Path) -> bool:
+    async def _probe_in_process(self, file_path: Path) -> dict:
         """
-        Check if file is a video
+        Probe file with PyAV in the default executor
 
         Args:
-            file_path: Path to file
+            file_path: Path to media file
 
         Returns:
-            True if file is a video format
+            Parsed probe data in ffprobe layout
+
+        Raises:
+            FFmpegError: On PyAV failure
         """
-        command = [
-            "ffprobe",
-            "-v",
-            "quiet",
-            "-print_format",
-            "json",
-            "-show_format",
-            str(file_path),
-        ]
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, _probe_with_av, os.fspath(file_path)
+            )
+        except Exception as e:
+            raise FFmpegError(f"Probe {file_path.name} error: {e}")
+
+    async def probe(self, file_path: Path) -> dict:
+        """
+        Probe container format and streams in a single call
+
+        Uses PyAV in-process when installed, avoiding the ffprobe fork/exec.
+        Results are cached per (path, mtime, size), so repeated queries for
+        an unchanged file reuse the same output.
+
+        Args:
+            file_path: Path to media file
 
+        Returns:
+            Parsed ffprobe output with "format" and "streams" sections
+
+        Raises:
+            FFmpegError: On ffprobe failure
+        """
+        path_str = os.fspath(file_path)
         try:
-            result = await self._run_command(command, f"Check {file_path.name}")
-            data = json.loads(result.decode("utf-8"))
-            format_name = data.get("format", {}).get("format_name", "").lower()
+            stat = os.stat(path_str)
+        except OSError as e:
+            raise FFmpegError(f"Probe {file_path.name} failed: {e}")
+
+        key = (path_str, stat.st_mtime_ns, stat.st_size)
+        if (cached := self._probe_cache.get(key)) is not None:
+            return cached
+
+        if av is not None:
+            data = await self._probe_in_process(file_path)
+        else:
+            command = [
+                _binary("ffprobe"),
+                "-v",
+                "quiet",
+                "-print_format",
+                "json",
+                "-show_entries",
+                _PROBE_ENTRIES,
+                path_str,
+            ]
+
+            result = await self._run_command(command, f"Probe {file_path.name}")
+            data = json_loads(result)
+
+        self._probe_cache[key] = data
+        return data
+
+    def _reuse_probe(
+        self,
+        source_str: str,
+        source_stat: os.stat_result,
+        output_str: str,
+        output_stat: os.stat_result,
+    ) -> None:
+        """
+        Seed the probe cache for a stream-copied remux from its source
 
-            video_formats = ["mp4", "mov", "avi", "matroska", "webm", "flv"]
-            return any(fmt in format_name for fmt in video_formats)
-        except Exception as e:
-            self.logger.warning(f"Format check failed for {file_path.name}: {e}")
-            return False
+        Stream copy keeps codecs, dimensions and duration, so the source
+        probe describes the output apart from the container name.
+
+        Args:
+            source_str: Path of the remuxed input
+            source_stat: Stat of the remuxed input
+            output_str: Path of the remuxed output
+            output_stat: Stat of the remuxed output
+        """
+        source_key = (source_str, source_stat.st_mtime_ns, source_stat.st_size)
+        if (source := self._probe_cache.get(source_key)) is None:
+            return
+
+        output_key = (output_str, output_stat.st_mtime_ns, output_stat.st_size)
+        self._probe_cache[output_key] = {
+            "format": {**source.get("format", {}), "format_name": _MP4_FORMAT_NAME},
+            "streams": source.get("streams", []),
+        }
 
     async def get_video_metadata(
         self, file_path: Path
@@ -113,19 +483,8 @@ class FFmpegHelper:
         Returns:
             Tuple of (width, height, duration) or (None, None, None) on error
         """
-        command = [
-            "ffprobe",
-            "-v",
-            "quiet",
-            "-print_format",
-            "json",
-            "-show_streams",
-            str(file_path),
-        ]
-
         try:
-            result = await self._run_command(command, f"Metadata {file_path.name}")
-            data = json.loads(result.decode("utf-8"))
+            data = await self.probe(file_path)
 
             video_stream = next(
                 (s for s in data.get("streams", []) if s.get("codec_type") == "video"),
@@ -138,14 +497,18 @@ class FFmpegHelper:
 
             width = int(video_stream.get("width", 0))
             height = int(video_stream.get("height", 0))
-            duration = int(float(video_stream.get("duration", 0)) + 0.5)
+            # Matroska/WebM carry no stream-level duration in ffprobe output
+            duration = video_stream.get("duration") or data.get("format", {}).get(
+                "duration", 0
+            )
+            duration = int(float(duration) + 0.5)
 
             self.logger.info(
                 f"Metadata: {file_path.name} | {width}x{height} | {duration}s"
             )
             return width, height, duration
 
-        except (json.JSONDecodeError, ValueError, KeyError) as e:
+        except (ValueError, KeyError) as e:
             self.logger.error(f"Metadata parse failed for {file_path.name}: {e}")
             return None, None, None
         except FFmpegError as e:
@@ -166,20 +529,27 @@ class FFmpegHelper:
         Returns:
             Path to generated thumbnail or None on failure
         """
-        thumb_path = video_path.with_suffix(".jpg")
+        video_str = os.fspath(video_path)
+        thumb_str = f"{os.path.splitext(video_str)[0]}.jpg"
+        thumb_path = Path(thumb_str)
 
+        # -ss before -i seeks via the container index instead of decoding
+        # up to the timestamp; Telegram thumbnails are at most 320px per side
         command = [
-            "ffmpeg",
+            _binary("ffmpeg"),
             "-y",
-            "-i",
-            str(video_path),
             "-ss",
             time,
+            "-i",
+            video_str,
             "-vframes",
             "1",
+            "-vf",
+            # min() caps each side without upscaling smaller sources
+            "scale='min(320,iw)':'min(320,ih)':force_original_aspect_ratio=decrease",
             "-q:v",
             str(quality),
-            str(thumb_path),
+            thumb_str,
         ]
 
         try:
@@ -197,47 +567,191 @@ class FFmpegHelper:
             self.logger.error(f"Thumbnail generation failed: {e}")
             return None
 
+    async def probe_and_thumbnail(
+        self, video_path: Path, time: str = "00:00:05", quality: int = 3
+    ) -> Tuple[Tuple[Optional[int], Optional[int], Optional[int]], Optional[Path]]:
+        """
+        Extract metadata and generate thumbnail concurrently
+
+        After a stream-copy remux the metadata comes from the source probe
+        cache, so only the thumbnail spawns ffmpeg.
+
+        Args:
+            video_path: Path to video file
+            time: Timestamp for thumbnail (HH:MM:SS format)
+            quality: JPEG quality (2-31, lower is better)
+
+        Returns:
+            Tuple of ((width, height, duration), thumbnail path or None)
+        """
+        metadata, thumb_path = await asyncio.gather(
+            self.get_video_metadata(video_path),
+            self.generate_thumbnail(video_path, time, quality),
+        )
+        return metadata, thumb_path
+
+    async def detect_hw_encoder(self) -> Optional[str]:
+        """
+        Find a working hardware H.264 encoder
+
+        Builds often list nvenc/vaapi on hosts without a GPU, so each listed
+        encoder must also pass a one-frame test encode.
+
+        Returns:
+            Encoder name (e.g. "h264_nvenc"), or None to use libx264
+        """
+        cls = type(self)
+        if cls._hw_detected:
+            return cls._hw_encoder
+
+        try:
+            output = await self._run_command(
+                [_binary("ffmpeg"), "-hide_banner", "-encoders"],
+                "List encoders",
+                timeout=10,
+            )
+            listing = output.decode("utf-8", errors="ignore")
+        except FFmpegError as e:
+            self.logger.warning(f"Encoder detection failed: {e}")
+            listing = ""
+
+        cls._hw_encoder = None
+        for encoder in _HW_ENCODERS:
+            if encoder not in listing:
+                continue
+            try:
+                await self._run_command(
+                    _encoder_test_command(encoder), f"Test {encoder}", timeout=10
+                )
+            except FFmpegError:
+                self.logger.debug("%s listed but not usable", encoder)
+                continue
+            cls._hw_encoder = encoder
+            break
+
+        cls._hw_detected = True
+        self.logger.info(f"H.264 encoder: {cls._hw_encoder or 'libx264'}")
+        return cls._hw_encoder
+
+    async def transcode_plan(self, file_path: Path) -> Tuple[bool, bool]:
+        """
+        Decide which tracks must be re-encoded to stream on Telegram
+
+        Args:
+            file_path: Path to video file
+
+        Returns:
+            Tuple of (video, audio), True where the track can't be copied
+        """
+        if self.force_transcode:
+            return True, True
+        if not self.transcode_incompatible:
+            return False, False
+
+        try:
+            video_codec, audio_codec = _stream_codecs(await self.probe(file_path))
+        except FFmpegError as e:
+            # Unknown codecs: remux as before and let Telegram decide
+            self.logger.warning(f"Codec check failed for {file_path.name}: {e}")
+            return False, False
+
+        return (
+            video_codec not in _COPY_VIDEO_CODECS,
+            audio_codec is not None and audio_codec not in _COPY_AUDIO_CODECS,
+        )
+
+    async def is_streaming_ready(self, file_path: Path) -> bool:
+        """
+        Check whether a video can be uploaded without optimization
+
+        Args:
+            file_path: Path to video file
+
+        Returns:
+            True if moov precedes mdat and no track needs transcoding
+        """
+        if not _moov_before_mdat(os.fspath(file_path)):
+            return False
+        return not any(await self.transcode_plan(file_path))
+
     async def optimize_for_streaming(
         self, input_path: Path, timeout: int = 180
     ) -> Optional[Path]:
         """
         Optimize video for streaming (faststart)
 
+        Remuxed with stream copy. With transcode_incompatible set, a track
+        with a codec Telegram can't stream is re-encoded instead (video to
+        H.264, audio to AAC), under transcode_timeout instead of timeout.
+
         Args:
             input_path: Path to input video
-            timeout: Operation timeout
+            timeout: Remux timeout in seconds
 
         Returns:
             Path to optimized file or None on failure
         """
-        output_path = input_path.with_stem(f"{input_path.stem}_stream")
+        input_str = os.fspath(input_path)
+        video, audio = await self.transcode_plan(input_path)
 
-        command = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            str(input_path),
-            "-c",
-            "copy",
-            "-movflags",
-            "+faststart",
-            "-f",
-            "mp4",
-            str(output_path),
-        ]
+        root, ext = os.path.splitext(input_str)
+        output_str = f"{root}_stream{ext}"
+        output_path = Path(output_str)
+
+        encoder = await self.detect_hw_encoder() if video else None
+        if video or audio:
+            action, timeout = "Transcode", self.transcode_timeout
+        else:
+            action = "Optimize"
+        description = f"{action} {input_path.name}"
 
+        optimized = False
         try:
-            await self._run_command(
-                command, f"Optimize {input_path.name}", timeout=timeout
-            )
+            try:
+                await self._run_command(
+                    _streaming_command(
+                        input_str,
+                        output_str,
+                        video,
+                        audio,
+                        encoder,
+                        self.preset,
+                        self.crf,
+                    ),
+                    description,
+                    timeout=timeout,
+                )
+            except FFmpegError as e:
+                if encoder is None:
+                    raise
+                # Passed the test encode but failed on real input; don't
+                # pay for the failing run again on later transcodes
+                self.logger.warning(f"{encoder} failed, retrying with libx264: {e}")
+                type(self)._hw_encoder = None
+                await self._run_command(
+                    _streaming_command(
+                        input_str, output_str, video, audio, None, self.preset, self.crf
+                    ),
+                    description,
+                    timeout=timeout,
+                )
 
             if output_path.exists():
-                orig_size = input_path.stat().st_size
-                opt_size = output_path.stat().st_size
+                orig_stat = os.stat(input_str)
+                opt_stat = os.stat(output_str)
+                if not (video or audio):
+                    self._reuse_probe(input_str, orig_stat, output_str, opt_stat)
+
+                # The input is only deleted once the upload finishes; free its
+                # cached pages now so they don't compete with the output's
+                _drop_cached_pages(input_str)
+
                 self.logger.info(
                     f"Optimized: {output_path.name} | "
-                    f"{humanbytes(orig_size)} → {humanbytes(opt_size)}"
+                    f"{humanbytes(orig_stat.st_size)} → "
+                    f"{humanbytes(opt_stat.st_size)}"
                 )
+                optimized = True
                 return output_path
 
             self.logger.warning(f"Optimization failed: no output file")
@@ -246,3 +760,9 @@ class FFmpegHelper:
         except FFmpegError as e:
             self.logger.error(f"Optimization failed: {e}")
             return None
+
+        finally:
+            # A failed, timed out or cancelled run can leave a partial file
+            if not optimized:
+                with suppress(OSError):
+                    output_path.unlink(missing_ok=True)
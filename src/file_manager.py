@@ -1,14 +1,30 @@
 import asyncio
 import logging
+import os
+import re
 from pathlib import Path
 from typing import Optional, List
 
+# Anything other than unicode alphanumerics and "._- " (\w also covers "_")
+_UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.\- ]")
+
 
 class FileManager:
     """Handles file operations with async support"""
 
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, offload_fs: bool = False
+    ):
+        """
+        Initialize file manager
+
+        Args:
+            logger: Optional logger instance
+            offload_fs: Run unlink in the default executor (for NFS/FUSE mounts
+                where it may block); local unlinks are done inline
+        """
         self.logger = logger or logging.getLogger(__name__)
+        self.offload_fs = offload_fs
 
     async def cleanup_file(self, file_path: Optional[Path]) -> bool:
         """
@@ -18,22 +34,17 @@ class FileManager:
             file_path: Path to file to remove
 
         Returns:
-            True if file was removed, False otherwise
+            True unless removal failed with an OS error
         """
-        if not file_path or not file_path.exists():
+        if not file_path:
             return False
 
-        try:
-            await asyncio.get_event_loop().run_in_executor(None, file_path.unlink)
-            self.logger.debug(f"Cleaned up: {file_path.name}")
-            return True
-        except Exception as e:
-            self.logger.error(f"Cleanup failed for {file_path.name}: {e}")
-            return False
+        results = await self.cleanup_files(file_path)
+        return results[0]
 
     async def cleanup_files(self, *file_paths: Optional[Path]) -> List[bool]:
         """
-        Cleanup multiple files concurrently
+        Cleanup multiple files in one batch
 
         Args:
             *file_paths: Variable number of file paths to cleanup
@@ -41,8 +52,35 @@ class FileManager:
         Returns:
             List of cleanup results (True/False for each file)
         """
-        tasks = [self.cleanup_file(path) for path in file_paths if path is not None]
-        return await asyncio.gather(*tasks, return_exceptions=False)
+        paths = [path for path in file_paths if path is not None]
+
+        if self.offload_fs:
+            # One executor job for the whole batch instead of one per file
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._unlink_batch, paths
+            )
+        return self._unlink_batch(paths)
+
+    def _unlink_batch(self, paths: List[Path]) -> List[bool]:
+        """
+        Remove files synchronously, isolating failures per file
+
+        Args:
+            paths: File paths to remove
+
+        Returns:
+            List of cleanup results (False only where removal raised)
+        """
+        results = []
+        for path in paths:
+            try:
+                path.unlink(missing_ok=True)
+                self.logger.debug("Cleaned up: %s", path.name)
+                results.append(True)
+            except OSError as e:
+                self.logger.error("Cleanup failed for %s: %s", path.name, e)
+                results.append(False)
+        return results
 
     async def ensure_directory(self, dir_path: Path) -> bool:
         """
@@ -55,12 +93,39 @@ class FileManager:
             True if directory exists or was created
         """
         try:
-            await asyncio.get_event_loop().run_in_executor(
+            await asyncio.get_running_loop().run_in_executor(
                 None, dir_path.mkdir, True, True
             )
             return True
         except Exception as e:
-            self.logger.error(f"Failed to create directory {dir_path}: {e}")
+            self.logger.error("Failed to create directory %s: %s", dir_path, e)
+            return False
+
+    async def preallocate(self, fd: int, size: int) -> bool:
+        """
+        Reserve disk blocks for a file about to be written sequentially
+
+        Best effort: a no-op where os.posix_fallocate is unavailable.
+
+        Args:
+            fd: Open file descriptor
+            size: Expected final size in bytes
+
+        Returns:
+            True if the space was reserved
+        """
+        if size <= 0 or not hasattr(os, "posix_fallocate"):
+            return False
+
+        try:
+            # Always offloaded, one hop per download: glibc emulates fallocate
+            # by writing every block where the filesystem lacks support
+            await asyncio.get_running_loop().run_in_executor(
+                None, os.posix_fallocate, fd, 0, size
+            )
+            return True
+        except OSError as e:
+            self.logger.debug("Preallocation failed: %s", e)
             return False
 
     def get_safe_filename(self, filename: str, extension: str = "") -> str:
@@ -75,8 +140,7 @@ class FileManager:
             Sanitized filename with correct extension
         """
         # Remove invalid characters
-        safe_name = "".join(c for c in filename if c.isalnum() or c in "._- ")
-        safe_name = safe_name.strip()
+        safe_name = _UNSAFE_FILENAME_CHARS.sub("", filename).strip()
 
         # Ensure extension
         if extension:
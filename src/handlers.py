@@ -1,11 +1,42 @@
+import asyncio
 import logging
+import re
+from typing import Optional, Tuple
+
 from telethon import TelegramClient
 
 from src.config import Config
 from src.utils import TaskType, humanbytes
 from src.task_manager import TaskManager
+from src.rate_limiter import TokenBucket
 from src.workers import Workers
 
+# "/upload name caption...": first word, remainder
+_UPLOAD_RE = re.compile(
+    r"^/upload(?:\s+(\S+))?(?:\s+(.*))?$", re.IGNORECASE | re.DOTALL
+)
+
+_USAGE_UPLOAD = (
+    "❌ **Usage:**\n"
+    "`/upload [filename] [caption]`\n\n"
+    "**Examples:**\n"
+    "`/upload video.mp4`\n"
+    "`/upload video.mp4 My awesome video`"
+)
+_USAGE_DOWNLOAD = (
+    "❌ **Usage:**\n"
+    "`/download [filename]`\n\n"
+    "**Example:**\n"
+    "`/download myvideo.mp4`"
+)
+_USAGE_LIMITS = (
+    "❌ **Usage:**\n"
+    "`/limits [downloads] [uploads]`\n"
+    f"Each limit must be between 1 and {Config.MAX_CONCURRENCY_LIMIT}.\n\n"
+    "**Example:**\n"
+    "`/limits 4 2`"
+)
+
 
 class CommandHandlers:
     """Handler for all bot commands"""
@@ -22,37 +53,108 @@ class CommandHandlers:
         self.config = config
         self.logger = logger
 
+        # Throttle message edits to stay under Telegram's flood limits
+        self._edit_bucket = TokenBucket(config.EDIT_RATE, config.EDIT_BURST)
+
+        # Static replies are rendered once, not per command
+        self._help_text = self._build_help_text()
+
+    def _build_help_text(self) -> str:
+        """Render /help reply; rebuilt only when the limits change"""
+        return f"""
+🤖 **Telegram Userbot - Help**
+
+**📥 Download:**
+`/download [filename]` - Download replied file
+Example: `/download myvideo.mp4`
+
+**📤 Upload:**
+`/upload [filename] [caption]` - Upload video
+Example: `/upload video.mp4 My Video`
+
+**📊 Status:**
+`/status` - Show active tasks
+`/limits [downloads] [uploads]` - Show or change concurrency limits
+
+**🔧 Utilities:**
+`/id` - Get current chat ID
+`/logs` - Toggle debug logging
+`/help` - Show this message
+
+**⚙️ Settings:**
+• Max downloads: `{self.task_manager.get_limit(TaskType.DOWNLOAD)}`
+• Max uploads: `{self.task_manager.get_limit(TaskType.UPLOAD)}`
+
+**✨ Features:**
+✅ Concurrent operations with queue management
+✅ Automatic video streaming optimization
+✅ Thumbnail generation
+✅ Progress tracking with throttling
+✅ Comprehensive error handling
+✅ Automatic file cleanup
+"""
+
+    async def _edit(self, event, text: str):
+        """Edit command message, rate-limited by the shared token bucket"""
+        async with self._edit_bucket:
+            return await event.edit(text)
+
+    def _active_summary(self) -> str:
+        """Format active task counts against their limits"""
+        downloads = len(self.task_manager.get_tasks_by_type(TaskType.DOWNLOAD))
+        uploads = len(self.task_manager.get_tasks_by_type(TaskType.UPLOAD))
+        max_downloads = self.task_manager.get_limit(TaskType.DOWNLOAD)
+        max_uploads = self.task_manager.get_limit(TaskType.UPLOAD)
+
+        return (
+            f"📊 Active: Downloads `{downloads}/{max_downloads}` | "
+            f"Uploads `{uploads}/{max_uploads}`"
+        )
+
+    def _limits_text(self) -> str:
+        """Format the live concurrency limits held by the task manager"""
+        return (
+            f"⚙️ **Limits:** Downloads `{self.task_manager.get_limit(TaskType.DOWNLOAD)}` | "
+            f"Uploads `{self.task_manager.get_limit(TaskType.UPLOAD)}`"
+        )
+
+    @staticmethod
+    def _parse_args(text: str) -> Tuple[Optional[str], Optional[str]]:
+        """Split /upload command text into (filename, caption)"""
+        match = _UPLOAD_RE.match(text)
+        if not match:
+            return None, None
+        return match.group(1), (match.group(2) or "").strip() or None
+
+    @staticmethod
+    def _command_remainder(text: str) -> Optional[str]:
+        """Return everything after the command word, stripped, or None"""
+        parts = (text or "").split(maxsplit=1)
+        if len(parts) < 2:
+            return None
+        return parts[1].strip() or None
+
     async def handle_upload(self, event):
         """Handle /upload command"""
         # Validate config
         if self.config.GUDANG_CHAT_ID == -100123456789:
-            await event.edit("❌ Please set `GUDANG_CHAT_ID` in .env file!")
+            await self._edit(event, "❌ Please set `GUDANG_CHAT_ID` in .env file!")
             return
 
         # Parse command
-        parts = event.message.text.split(maxsplit=1)
-        if len(parts) < 2:
-            await event.edit(
-                "❌ **Usage:**\n"
-                "`/upload [filename] [caption]`\n\n"
-                "**Examples:**\n"
-                "`/upload video.mp4`\n"
-                "`/upload video.mp4 My awesome video`"
-            )
+        filename, caption = self._parse_args(event.message.text)
+        if not filename:
+            await self._edit(event, _USAGE_UPLOAD)
             return
 
-        args = parts[1].split(maxsplit=1)
-        filename = args[0]
-        caption = args[1] if len(args) > 1 else None
-
         # Check file exists
         file_path = self.config.download_path / filename
         if not file_path.exists():
-            await event.edit(f"❌ File not found: `{filename}`")
+            await self._edit(event, f"❌ File not found: `{filename}`")
             return
 
         # Reserve task ID and create worker
-        task_id = await self.task_manager.reserve_task_id()
+        task_id = self.task_manager.reserve_task_id()
 
         worker_coro = Workers.upload_worker(
             self.client,
@@ -65,20 +167,26 @@ class CommandHandlers:
             self.logger,
         )
 
-        # Register and start task
-        await self.task_manager.register_task(
-            task_id, TaskType.UPLOAD, filename, worker_coro
-        )
+        # Register and queue task (rejected when the queue is full)
+        try:
+            self.task_manager.register_task(
+                task_id, TaskType.UPLOAD, filename, worker_coro
+            )
+        except asyncio.QueueFull:
+            await self._edit(
+                event,
+                f"⏳ **Upload Queue Full** "
+                f"(`{self.config.MAX_QUEUED_UPLOADS}` waiting)\n"
+                "Try again when a running task finishes.",
+            )
+            return
 
         # Show status
-        downloads = len(self.task_manager.get_tasks_by_type(TaskType.DOWNLOAD))
-        uploads = len(self.task_manager.get_tasks_by_type(TaskType.UPLOAD))
-
-        await event.edit(
+        await self._edit(
+            event,
             f"🚀 **Upload Queued** [`{task_id}`]\n"
             f"📄 File: `{filename}`\n"
-            f"📊 Active: Downloads `{downloads}/{self.config.MAX_CONCURRENT_DOWNLOADS}` | "
-            f"Uploads `{uploads}/{self.config.MAX_CONCURRENT_UPLOADS}`"
+            f"{self._active_summary()}",
         )
 
     async def handle_download(self, event):
@@ -86,22 +194,15 @@ class CommandHandlers:
         # Validate replied message
         replied = await event.get_reply_message()
         if not replied or not replied.file:
-            await event.edit("❌ Reply to a video/document file!")
+            await self._edit(event, "❌ Reply to a video/document file!")
             return
 
         # Parse command
-        parts = event.message.text.split(maxsplit=1)
-        if len(parts) < 2:
-            await event.edit(
-                "❌ **Usage:**\n"
-                "`/download [filename]`\n\n"
-                "**Example:**\n"
-                "`/download myvideo.mp4`"
-            )
+        filename_base = self._command_remainder(event.message.text)
+        if not filename_base:
+            await self._edit(event, _USAGE_DOWNLOAD)
             return
 
-        filename_base = parts[1].strip()
-
         # Determine extension
         ext = ".mp4"
         if replied.file.name and "." in replied.file.name:
@@ -116,14 +217,15 @@ class CommandHandlers:
         # Check if file exists
         file_path = self.config.download_path / filename
         if file_path.exists():
-            await event.edit(
+            await self._edit(
+                event,
                 f"⚠️ File `{filename}` already exists!\n"
-                "Delete it first or use a different name."
+                "Delete it first or use a different name.",
             )
             return
 
         # Reserve task ID and create worker
-        task_id = await self.task_manager.reserve_task_id()
+        task_id = self.task_manager.reserve_task_id()
 
         worker_coro = Workers.download_worker(
             self.client,
@@ -136,21 +238,27 @@ class CommandHandlers:
             self.logger,
         )
 
-        # Register and start task
-        await self.task_manager.register_task(
-            task_id, TaskType.DOWNLOAD, filename, worker_coro
-        )
+        # Register and queue task (rejected when the queue is full)
+        try:
+            self.task_manager.register_task(
+                task_id, TaskType.DOWNLOAD, filename, worker_coro
+            )
+        except asyncio.QueueFull:
+            await self._edit(
+                event,
+                f"⏳ **Download Queue Full** "
+                f"(`{self.config.MAX_QUEUED_DOWNLOADS}` waiting)\n"
+                "Try again when a running task finishes.",
+            )
+            return
 
         # Show status
-        downloads = len(self.task_manager.get_tasks_by_type(TaskType.DOWNLOAD))
-        uploads = len(self.task_manager.get_tasks_by_type(TaskType.UPLOAD))
-
-        await event.edit(
+        await self._edit(
+            event,
             f"🚀 **Download Queued** [`{task_id}`]\n"
             f"📄 File: `{filename}`\n"
             f"💾 Size: `{humanbytes(replied.file.size)}`\n"
-            f"📊 Active: Downloads `{downloads}/{self.config.MAX_CONCURRENT_DOWNLOADS}` | "
-            f"Uploads `{uploads}/{self.config.MAX_CONCURRENT_UPLOADS}`"
+            f"{self._active_summary()}",
         )
 
     async def handle_status(self, event):
@@ -158,38 +266,36 @@ class CommandHandlers:
         tasks = self.task_manager.get_all_tasks()
 
         if not tasks:
-            await event.edit("✅ No active tasks")
+            await self._edit(event, "✅ No active tasks")
             return
 
         downloads = self.task_manager.get_tasks_by_type(TaskType.DOWNLOAD)
         uploads = self.task_manager.get_tasks_by_type(TaskType.UPLOAD)
 
-        text = f"📊 **Active Tasks:** `{len(tasks)}`\n"
-        text += (
-            f"⚙️ **Limits:** Downloads `{self.config.MAX_CONCURRENT_DOWNLOADS}` | "
-            f"Uploads `{self.config.MAX_CONCURRENT_UPLOADS}`\n\n"
-        )
+        parts = [
+            f"📊 **Active Tasks:** `{len(tasks)}`\n",
+            f"{self._limits_text()}\n\n",
+        ]
 
         if downloads:
-            text += f"⏬ **Downloads ({len(downloads)}):**\n"
-            for task in downloads:
-                text += f"  • [`{task.task_id}`] `{task.filename}`\n"
-            text += "\n"
+            parts.append(f"⏬ **Downloads ({len(downloads)}):**\n")
+            parts.extend(f"  • [`{t.task_id}`] `{t.filename}`\n" for t in downloads)
+            parts.append("\n")
 
         if uploads:
-            text += f"📤 **Uploads ({len(uploads)}):**\n"
-            for task in uploads:
-                text += f"  • [`{task.task_id}`] `{task.filename}`\n"
+            parts.append(f"📤 **Uploads ({len(uploads)}):**\n")
+            parts.extend(f"  • [`{t.task_id}`] `{t.filename}`\n" for t in uploads)
 
-        await event.edit(text)
+        await self._edit(event, "".join(parts))
 
     async def handle_id(self, event):
         """Handle /id command"""
         chat_id = event.chat_id
         chat_type = "User" if chat_id > 0 else "Group/Channel"
 
-        await event.edit(
-            f"🆔 **Chat Information**\n\n**ID:** `{chat_id}`\n**Type:** `{chat_type}`"
+        await self._edit(
+            event,
+            f"🆔 **Chat Information**\n\n**ID:** `{chat_id}`\n**Type:** `{chat_type}`",
         )
 
     async def handle_logs(self, event):
@@ -198,42 +304,38 @@ class CommandHandlers:
 
         if current_level == logging.INFO:
             self.logger.setLevel(logging.DEBUG)
-            await event.edit("🔍 **Debug logging enabled**")
+            await self._edit(event, "🔍 **Debug logging enabled**")
         else:
             self.logger.setLevel(logging.INFO)
-            await event.edit("🔍 **Debug logging disabled**")
-
-    async def handle_help(self, event):
-        """Handle /help command"""
-        help_text = f"""
-🤖 **Telegram Userbot - Help**
+            await self._edit(event, "🔍 **Debug logging disabled**")
 
-**📥 Download:**
-`/download [filename]` - Download replied file
-Example: `/download myvideo.mp4`
+    async def handle_limits(self, event):
+        """Handle /limits command - show or change concurrency limits"""
+        parts = event.message.text.split()
 
-**📤 Upload:**
-`/upload [filename] [caption]` - Upload video
-Example: `/upload video.mp4 My Video`
+        if len(parts) == 1:
+            await self._edit(event, self._limits_text())
+            return
 
-**📊 Status:**
-`/status` - Show active tasks
+        try:
+            downloads, uploads = (int(value) for value in parts[1:])
+            # Each unit of limit is a pool worker spawned immediately
+            upper = self.config.MAX_CONCURRENCY_LIMIT
+            if not (1 <= downloads <= upper and 1 <= uploads <= upper):
+                raise ValueError
+        except ValueError:
+            await self._edit(event, _USAGE_LIMITS)
+            return
 
-**🔧 Utilities:**
-`/id` - Get current chat ID
-`/logs` - Toggle debug logging
-`/help` - Show this message
+        self.task_manager.set_limit(TaskType.DOWNLOAD, downloads)
+        self.task_manager.set_limit(TaskType.UPLOAD, uploads)
+        self._help_text = self._build_help_text()
 
-**⚙️ Settings:**
-• Max downloads: `{self.config.MAX_CONCURRENT_DOWNLOADS}`
-• Max uploads: `{self.config.MAX_CONCURRENT_UPLOADS}`
+        await self._edit(
+            event,
+            f"✅ **Limits updated:** Downloads `{downloads}` | Uploads `{uploads}`",
+        )
 
-**✨ Features:**
-✅ Concurrent operations with queue management
-✅ Automatic video streaming optimization
-✅ Thumbnail generation
-✅ Progress tracking with throttling
-✅ Comprehensive error handling
-✅ Automatic file cleanup
-"""
-        await event.edit(help_text)
+    async def handle_help(self, event):
+        """Handle /help command"""
+        await self._edit(event, self._help_text)
@@ -14,10 +14,17 @@ class ColoredFormatter(logging.Formatter):
     }
     RESET = "\033[0m"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Padded, colored level names built once instead of per record
+        self._cached = {
+            level: f"{color}{level:8}{self.RESET}"
+            for level, color in self.COLORS.items()
+        }
+
     def format(self, record):
         """Format log record with colors"""
-        color = self.COLORS.get(record.levelname, self.RESET)
-        record.levelname = f"{color}{record.levelname:8}{self.RESET}"
+        record.levelname = self._cached.get(record.levelname, record.levelname)
         return super().format(record)
 
 
@@ -40,6 +47,11 @@ def setup_logger(name: str = "userbot", level: int = logging.INFO) -> logging.Lo
 
     logger.setLevel(level)
 
+    # Thread/process fields are never formatted, skip collecting them
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
     # Console handler with colored formatter
     handler = logging.StreamHandler(sys.stdout)
     formatter = ColoredFormatter(
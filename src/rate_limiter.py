@@ -0,0 +1,44 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter"""
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Initialize token bucket
+
+        Args:
+            rate: Tokens refilled per second
+            burst: Maximum tokens available at once
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and consume it"""
+        # Lock keeps waiters in FIFO order while one of them sleeps for refill
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aenter__(self) -> "TokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        pass
@@ -1,28 +1,29 @@
 import asyncio
 import logging
 from dataclasses import dataclass
-from typing import Dict, List, Optional, Coroutine, Any
+from typing import Dict, List, Optional, Coroutine, Any, Set
 
 from src.utils import TaskType
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Task:
     """Task metadata"""
 
     task_id: int
     task_type: TaskType
     filename: str
-    task_obj: asyncio.Task
 
 
 class TaskManager:
-    """Manages concurrent tasks with semaphore-based rate limiting"""
+    """Manages concurrent tasks with bounded queues and a worker pool"""
 
     def __init__(
         self,
         max_downloads: int,
         max_uploads: int,
+        max_queued_downloads: int = 10,
+        max_queued_uploads: int = 10,
         logger: Optional[logging.Logger] = None,
     ):
         """
@@ -31,36 +32,116 @@ class TaskManager:
         Args:
             max_downloads: Maximum concurrent downloads
             max_uploads: Maximum concurrent uploads
+            max_queued_downloads: Maximum downloads waiting for a worker
+            max_queued_uploads: Maximum uploads waiting for a worker
             logger: Optional logger instance
         """
         self._tasks: Dict[int, Task] = {}
+        # Per-type index (dicts keep task_id order for /status listings)
+        self._by_type: Dict[TaskType, Dict[int, Task]] = {t: {} for t in TaskType}
         self._counter: int = 0
-        self._lock = asyncio.Lock()
-
-        # Semaphores for concurrency control
-        self.download_sem = asyncio.Semaphore(max_downloads)
-        self.upload_sem = asyncio.Semaphore(max_uploads)
+        self._task_group: Optional[asyncio.TaskGroup] = None
+
+        # Bounded job queues drained by a pool of workers per type; the pool
+        # size is the concurrency limit and can be changed at runtime
+        self._queues: Dict[TaskType, asyncio.Queue] = {
+            TaskType.DOWNLOAD: asyncio.Queue(maxsize=max_queued_downloads),
+            TaskType.UPLOAD: asyncio.Queue(maxsize=max_queued_uploads),
+        }
+        self._limits: Dict[TaskType, int] = {
+            TaskType.DOWNLOAD: max_downloads,
+            TaskType.UPLOAD: max_uploads,
+        }
+        self._pools: Dict[TaskType, Set[asyncio.Task]] = {t: set() for t in TaskType}
+        self._idle: Dict[TaskType, Set[asyncio.Task]] = {t: set() for t in TaskType}
 
         self.logger = logger or logging.getLogger(__name__)
         self.logger.info(
-            f"TaskManager initialized: downloads={max_downloads}, uploads={max_uploads}"
+            "TaskManager initialized: downloads=%d, uploads=%d",
+            max_downloads,
+            max_uploads,
         )
 
-    async def reserve_task_id(self) -> int:
-        """Reserve and return next task ID"""
-        async with self._lock:
-            self._counter += 1
-            return self._counter
-
-    async def register_task(
+    async def __aenter__(self) -> "TaskManager":
+        """Open the task group and start the worker pool"""
+        self._task_group = asyncio.TaskGroup()
+        await self._task_group.__aenter__()
+
+        for task_type in TaskType:
+            self._resize_pool(task_type)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """Stop the worker pool and close the task group"""
+        for task_type in TaskType:
+            for worker in self._pools[task_type]:
+                worker.cancel()
+            self._pools[task_type].clear()
+            self._idle[task_type].clear()
+
+        # Workers are already cancelled; keeping the body's exception out of
+        # the group lets it propagate as-is instead of as an ExceptionGroup
+        task_group, self._task_group = self._task_group, None
+        await task_group.__aexit__(None, None, None)
+
+    def _resize_pool(self, task_type: TaskType) -> None:
+        """Spawn or retire pool workers to match the limit for task_type"""
+        pool = self._pools[task_type]
+        limit = self._limits[task_type]
+
+        while len(pool) < limit:
+            pool.add(self._task_group.create_task(self._pool_worker(task_type)))
+
+        # Idle workers stop now; busy ones retire after their current job
+        for worker in list(self._idle[task_type]):
+            if len(pool) <= limit:
+                break
+            pool.discard(worker)
+            self._idle[task_type].discard(worker)
+            worker.cancel()
+
+    async def _pool_worker(self, task_type: TaskType) -> None:
+        """Run queued jobs of one task type, one at a time"""
+        queue = self._queues[task_type]
+        pool = self._pools[task_type]
+        idle = self._idle[task_type]
+        worker = asyncio.current_task()
+
+        while len(pool) <= self._limits[task_type]:
+            idle.add(worker)
+            try:
+                task_id, coro = await queue.get()
+            finally:
+                idle.discard(worker)
+
+            try:
+                await self._run_guarded(task_id, coro)
+            finally:
+                queue.task_done()
+
+        pool.discard(worker)
+
+    async def _run_guarded(self, task_id: int, coro: Coroutine[Any, Any, None]):
+        """Run worker coroutine so its failure can't stop the pool worker"""
+        try:
+            await coro
+        except Exception:
+            self.logger.exception("Task %3d | Unhandled worker error", task_id)
+
+    def reserve_task_id(self) -> int:
+        """Reserve and return next task ID (atomic on the event loop thread)"""
+        self._counter += 1
+        return self._counter
+
+    def register_task(
         self,
         task_id: int,
         task_type: TaskType,
         filename: str,
         coro: Coroutine[Any, Any, None],
-    ) -> asyncio.Task:
+    ) -> None:
         """
-        Register and start a new task
+        Register a new task and queue it for the worker pool
 
         Args:
             task_id: Unique task identifier
@@ -68,30 +149,50 @@ class TaskManager:
             filename: Associated filename
             coro: Coroutine to execute
 
-        Returns:
-            Created asyncio.Task object
+        Raises:
+            asyncio.QueueFull: If too many tasks of this type are waiting
         """
-        async with self._lock:
-            task_obj = asyncio.create_task(coro)
-            self._tasks[task_id] = Task(task_id, task_type, filename, task_obj)
-            self.logger.info(
-                f"Task {task_id:3} | {task_type.value.upper():8} | "
-                f"Registered: {filename}"
+        if self._task_group is None:
+            coro.close()
+            raise RuntimeError("TaskManager must be entered before registering tasks")
+
+        try:
+            self._queues[task_type].put_nowait((task_id, coro))
+        except asyncio.QueueFull:
+            coro.close()
+            self.logger.warning(
+                "Task %3d | %s | Queue full, rejected: %s",
+                task_id,
+                task_type.label,
+                filename,
             )
-            return task_obj
+            raise
 
-    async def remove_task(self, task_id: int) -> None:
+        task = Task(task_id, task_type, filename)
+        self._tasks[task_id] = task
+        self._by_type[task_type][task_id] = task
+        self.logger.info(
+            "Task %3d | %s | Registered: %s",
+            task_id,
+            task_type.label,
+            filename,
+        )
+
+    def remove_task(self, task_id: int) -> None:
         """Remove completed task from tracking"""
-        async with self._lock:
-            if task := self._tasks.pop(task_id, None):
-                self.logger.info(
-                    f"Task {task_id:3} | {task.task_type.value.upper():8} | "
-                    f"Removed: {task.filename} | Active: {len(self._tasks)}"
-                )
+        if task := self._tasks.pop(task_id, None):
+            self._by_type[task.task_type].pop(task_id, None)
+            self.logger.info(
+                "Task %3d | %s | Removed: %s | Active: %d",
+                task_id,
+                task.task_type.label,
+                task.filename,
+                len(self._tasks),
+            )
 
     def get_tasks_by_type(self, task_type: TaskType) -> List[Task]:
         """Get all tasks of a specific type"""
-        return [t for t in self._tasks.values() if t.task_type == task_type]
+        return list(self._by_type[task_type].values())
 
     def get_task_count(self) -> int:
         """Get total active task count"""
@@ -101,6 +202,13 @@ class TaskManager:
         """Get all active tasks"""
         return list(self._tasks.values())
 
-    def get_semaphore(self, task_type: TaskType) -> asyncio.Semaphore:
-        """Get appropriate semaphore for task type"""
-        return self.download_sem if task_type == TaskType.DOWNLOAD else self.upload_sem
+    def get_limit(self, task_type: TaskType) -> int:
+        """Get the concurrency limit for a task type"""
+        return self._limits[task_type]
+
+    def set_limit(self, task_type: TaskType, limit: int) -> None:
+        """Change the concurrency limit for a task type"""
+        self._limits[task_type] = limit
+        if self._task_group is not None:
+            self._resize_pool(task_type)
+        self.logger.info("Limit updated: %s=%d", task_type.value, limit)
@@ -1,7 +1,9 @@
-import time
+import asyncio
 import logging
 from enum import Enum
-from typing import Callable
+from typing import Optional, Tuple
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB", "PB")
 
 
 class TaskType(Enum):
@@ -10,6 +12,14 @@ class TaskType(Enum):
     DOWNLOAD = "download"
     UPLOAD = "upload"
 
+    def __init__(self, value: str):
+        self._label = value.upper().ljust(8)
+
+    @property
+    def label(self) -> str:
+        """Upper-cased name padded for log columns (e.g. "UPLOAD  ")"""
+        return self._label
+
 
 def humanbytes(size: int) -> str:
     """
@@ -21,52 +31,85 @@ def humanbytes(size: int) -> str:
     Returns:
         Human-readable string (e.g., "1.5 MB")
     """
-    if not size:
+    if not size or size <= 0:
         return "0 B"
 
-    units = ["B", "KB", "MB", "GB", "TB"]
-    power = 1024
-    index = 0
-
-    while size >= power and index < len(units) - 1:
-        size /= power
-        index += 1
-
-    return f"{size:.2f} {units[index]}"
-
-
-def create_progress_callback(
-    filename: str,
-    action: str,
-    interval: float,
-    logger: logging.Logger,
-) -> Callable[[int, int], None]:
-    """
-    Create throttled progress callback for file operations
-
-    Args:
-        filename: Name of file being processed
-        action: Action being performed (e.g., "Downloading")
-        interval: Minimum seconds between updates
-        logger: Logger instance
-
-    Returns:
-        Progress callback function
-    """
-    last_update = {"time": 0.0}
-
-    def callback(current: int, total: int) -> None:
-        """Progress callback with throttling"""
-        now = time.time()
-        elapsed = now - last_update["time"]
-
-        # Update on: interval passed, completion, or first call
-        if elapsed >= interval or current == total or last_update["time"] == 0:
-            percent = (current / total * 100) if total > 0 else 0
-            logger.info(
-                f"{action:12} | {filename:30} | "
-                f"{humanbytes(current):>10}/{humanbytes(total):<10} ({percent:5.1f}%)"
-            )
-            last_update["time"] = now
-
-    return callback
+    # Unit index is floor(log1024(size)), taken from the bit length
+    index = min((size.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    return f"{size / (1 << (index * 10)):.2f} {_SIZE_UNITS[index]}"
+
+
+class ProgressReporter:
+    """Coalescing progress reporter that logs from a background task"""
+
+    def __init__(
+        self,
+        filename: str,
+        action: str,
+        interval: float,
+        logger: logging.Logger,
+    ):
+        """
+        Initialize progress reporter
+
+        Args:
+            filename: Name of file being processed
+            action: Action being performed (e.g., "Downloading")
+            interval: Seconds between progress log lines
+            logger: Logger instance
+        """
+        self.filename = filename
+        self.action = action
+        self.interval = interval
+        self.logger = logger
+
+        # Latest (current, total); each transfer part overwrites it
+        self._latest: Optional[Tuple[int, int]] = None
+        self._reported: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, current: int, total: int) -> None:
+        """Record progress; called by telethon for every transferred part"""
+        self._latest = (current, total)
+
+    def _report(self) -> None:
+        """Log the latest progress if it changed since the last report"""
+        latest = self._latest
+        if latest is None or latest == self._reported:
+            return
+        self._reported = latest
+
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        current, total = latest
+        percent = (current / total * 100) if total > 0 else 0
+        self.logger.info(
+            "%-12s | %-30s | %10s/%-10s (%5.1f%%)",
+            self.action,
+            self.filename,
+            humanbytes(current),
+            humanbytes(total),
+            percent,
+        )
+
+    async def _run(self) -> None:
+        """Report progress every interval until cancelled"""
+        while True:
+            await asyncio.sleep(self.interval)
+            self._report()
+
+    async def __aenter__(self) -> "ProgressReporter":
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        # Final line, so completion is logged regardless of the interval
+        self._report()
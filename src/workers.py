@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import os
 from pathlib import Path
 from typing import Optional
 
@@ -7,7 +8,7 @@ from telethon import TelegramClient
 from telethon.tl.types import DocumentAttributeVideo
 
 from src.config import Config
-from src.utils import TaskType, create_progress_callback, humanbytes
+from src.utils import ProgressReporter, TaskType, humanbytes
 from src.task_manager import TaskManager
 from src.ffmpeg_helper import FFmpegHelper, FFmpegError
 from src.file_manager import FileManager
@@ -41,56 +42,69 @@ class Workers:
             logger: Logger instance
         """
         save_path = config.download_path / filename
-        file_manager = FileManager(logger)
-
-        async with task_manager.get_semaphore(TaskType.DOWNLOAD):
-            try:
-                file_size = message.file.size if message.file else 0
-                logger.info(
-                    f"Task {task_id:3} | DOWNLOAD | "
-                    f"{filename} ({humanbytes(file_size)})"
-                )
-
-                # Download with progress and timeout
-                await asyncio.wait_for(
-                    client.download_media(
-                        message,
-                        file=str(save_path),
-                        progress_callback=create_progress_callback(
-                            filename,
-                            "Downloading",
-                            config.PROGRESS_UPDATE_INTERVAL,
-                            logger,
+        # Preallocation makes the file full-size up front, so write under a
+        # temporary name and only expose it once every byte has arrived
+        part_path = save_path.with_name(filename + ".part")
+        file_manager = FileManager(logger, config.OFFLOAD_FS_OPS)
+        prefix = f"Task {task_id:3} | {TaskType.DOWNLOAD.label} |"
+        completed = False
+
+        try:
+            file_size = message.file.size if message.file else 0
+            size_str = humanbytes(file_size)
+            logger.info(f"{prefix} {filename} ({size_str})")
+
+            # Download into a buffered writer, so MTProto parts are
+            # coalesced before hitting the kernel
+            progress = ProgressReporter(
+                filename, "Downloading", config.PROGRESS_UPDATE_INTERVAL, logger
+            )
+            with open(
+                part_path, "wb", buffering=config.DOWNLOAD_BUFFER_SIZE
+            ) as out_file:
+                # Reserve contiguous extents up front instead of growing the
+                # file one buffered write at a time
+                await file_manager.preallocate(out_file.fileno(), file_size)
+
+                # download_media picks its own part size, but passes the
+                # message along so Telethon can refresh an expired file
+                # reference mid-download; download_file can't
+                async with progress:
+                    await asyncio.wait_for(
+                        client.download_media(
+                            message,
+                            file=out_file,
+                            progress_callback=progress,
                         ),
-                    ),
-                    timeout=config.DOWNLOAD_TIMEOUT,
-                )
-
-                logger.info(f"Task {task_id:3} | DOWNLOAD | Success: {filename}")
-
-                await event.respond(
-                    f"✅ **Download Complete** [`{task_id}`]\n"
-                    f"📄 File: `{filename}`\n"
-                    f"💾 Size: `{humanbytes(file_size)}`\n\n"
-                    f"Upload: `/upload {filename} [caption]`"
-                )
-
-            except asyncio.TimeoutError:
-                logger.error(f"Task {task_id:3} | DOWNLOAD | Timeout: {filename}")
-                await event.respond(
-                    f"❌ **Download Timeout** [`{task_id}`]\n`{filename}`"
-                )
-                await file_manager.cleanup_file(save_path)
-
-            except Exception as e:
-                logger.exception(f"Task {task_id:3} | DOWNLOAD | Error: {filename}")
-                await event.respond(
-                    f"❌ **Download Failed** [`{task_id}`]\nError: `{str(e)[:200]}`"
-                )
-                await file_manager.cleanup_file(save_path)
+                        timeout=config.DOWNLOAD_TIMEOUT,
+                    )
 
-            finally:
-                await task_manager.remove_task(task_id)
+            os.replace(part_path, save_path)
+            completed = True
+            logger.info(f"{prefix} Success: {filename}")
+
+            await event.respond(
+                f"✅ **Download Complete** [`{task_id}`]\n"
+                f"📄 File: `{filename}`\n"
+                f"💾 Size: `{size_str}`\n\n"
+                f"Upload: `/upload {filename} [caption]`"
+            )
+
+        except asyncio.TimeoutError:
+            logger.error(f"{prefix} Timeout: {filename}")
+            await event.respond(f"❌ **Download Timeout** [`{task_id}`]\n`{filename}`")
+
+        except Exception as e:
+            logger.exception(f"{prefix} Error: {filename}")
+            err = str(e)[:200]
+            await event.respond(f"❌ **Download Failed** [`{task_id}`]\nError: `{err}`")
+
+        finally:
+            # Also reached on cancellation (shutdown), which skips the
+            # except blocks above
+            if not completed:
+                await file_manager.cleanup_file(part_path)
+            task_manager.remove_task(task_id)
 
     @staticmethod
     async def upload_worker(
@@ -117,113 +131,111 @@ class Workers:
             logger: Logger instance
         """
         original_path = config.download_path / filename
-        file_manager = FileManager(logger)
-        ffmpeg = FFmpegHelper(logger)
+        prefix = f"Task {task_id:3} | {TaskType.UPLOAD.label} |"
+        file_manager = FileManager(logger, config.OFFLOAD_FS_OPS)
+        ffmpeg = FFmpegHelper(
+            logger,
+            transcode_incompatible=config.TRANSCODE_INCOMPATIBLE,
+            preset=config.FFMPEG_PRESET,
+            crf=config.FFMPEG_CRF,
+            transcode_timeout=config.FFMPEG_TRANSCODE_TIMEOUT,
+        )
 
         thumb_path: Optional[Path] = None
         optimized_path: Optional[Path] = None
         upload_path = original_path
         optimized = False
 
-        async with task_manager.get_semaphore(TaskType.UPLOAD):
-            try:
-                if not original_path.exists():
-                    raise FileNotFoundError(f"File not found: {filename}")
-
-                logger.info(
-                    f"Task {task_id:3} | UPLOAD   | "
-                    f"{filename} | Caption: {caption or 'None'}"
+        try:
+            if not original_path.exists():
+                raise FileNotFoundError(f"File not found: {filename}")
+
+            logger.info(f"{prefix} {filename} | Caption: {caption or 'None'}")
+
+            # Video optimization; the probe is cached for the checks below, and
+            # an unreadable file skips straight to the metadata error
+            is_video = original_path.suffix.lower() in config.VIDEO_EXTENSIONS
+            if is_video:
+                try:
+                    await ffmpeg.probe(original_path)
+                except FFmpegError as e:
+                    is_video = False
+                    logger.warning(f"{prefix} Probe failed, not optimizing: {e}")
+
+            if is_video:
+                if await ffmpeg.is_streaming_ready(original_path):
+                    logger.info(f"{prefix} Already streaming-ready, using original")
+                else:
+                    logger.info(f"{prefix} Optimizing video...")
+
+                    optimized_path = await ffmpeg.optimize_for_streaming(original_path)
+
+                    if optimized_path and optimized_path.exists():
+                        upload_path = optimized_path
+                        optimized = True
+                        logger.info(f"{prefix} Using optimized file")
+                    else:
+                        logger.warning(f"{prefix} Optimization failed, using original")
+
+            # Extract metadata and generate thumbnail concurrently
+            metadata, thumb_path = await ffmpeg.probe_and_thumbnail(
+                upload_path, config.THUMBNAIL_TIME, config.THUMBNAIL_QUALITY
+            )
+            width, height, duration = metadata
+
+            if not all([width, height, duration]):
+                raise ValueError("Failed to extract video metadata")
+
+            # Prepare attributes
+            attributes = [
+                DocumentAttributeVideo(
+                    duration=duration,
+                    w=width,
+                    h=height,
+                    supports_streaming=True,
                 )
+            ]
 
-                # Video optimization
-                if original_path.suffix.lower() in config.VIDEO_EXTENSIONS:
-                    if await ffmpeg.check_if_video(original_path):
-                        logger.info(
-                            f"Task {task_id:3} | UPLOAD   | Optimizing video..."
-                        )
-
-                        optimized_path = await ffmpeg.optimize_for_streaming(
-                            original_path
-                        )
-
-                        if optimized_path and optimized_path.exists():
-                            upload_path = optimized_path
-                            optimized = True
-                            logger.info(
-                                f"Task {task_id:3} | UPLOAD   | Using optimized file"
-                            )
-                        else:
-                            logger.warning(
-                                f"Task {task_id:3} | UPLOAD   | "
-                                "Optimization failed, using original"
-                            )
-
-                # Extract metadata
-                width, height, duration = await ffmpeg.get_video_metadata(upload_path)
-
-                if not all([width, height, duration]):
-                    raise ValueError("Failed to extract video metadata")
-
-                # Generate thumbnail
-                thumb_path = await ffmpeg.generate_thumbnail(
-                    upload_path, config.THUMBNAIL_TIME, config.THUMBNAIL_QUALITY
-                )
-
-                # Prepare attributes
-                attributes = [
-                    DocumentAttributeVideo(
-                        duration=duration,
-                        w=width,
-                        h=height,
-                        supports_streaming=True,
-                    )
-                ]
-
-                # Upload
-                logger.info(
-                    f"Task {task_id:3} | UPLOAD   | "
-                    f"Uploading to {config.GUDANG_CHAT_ID}..."
-                )
+            # Upload
+            logger.info(f"{prefix} Uploading to {config.GUDANG_CHAT_ID}...")
 
+            async with ProgressReporter(
+                filename, "Uploading", config.PROGRESS_UPDATE_INTERVAL, logger
+            ) as progress:
                 await client.send_file(
                     config.GUDANG_CHAT_ID,
-                    str(upload_path),
+                    os.fspath(upload_path),
                     caption=caption,
-                    thumb=str(thumb_path) if thumb_path else None,
+                    thumb=os.fspath(thumb_path) if thumb_path else None,
                     attributes=attributes,
-                    progress_callback=create_progress_callback(
-                        filename, "Uploading", config.PROGRESS_UPDATE_INTERVAL, logger
-                    ),
-                )
-
-                logger.info(f"Task {task_id:3} | UPLOAD   | Success: {filename}")
-
-                await event.respond(
-                    f"✅ **Upload Complete** [`{task_id}`]\n"
-                    f"📄 File: `{filename}`\n"
-                    f"📺 Resolution: `{width}x{height}`\n"
-                    f"⏱️ Duration: `{duration}s`\n"
-                    f"🎬 Streaming: `Enabled`\n"
-                    f"🔧 Optimized: `{'Yes' if optimized else 'No'}`"
-                )
-
-            except FileNotFoundError as e:
-                logger.error(f"Task {task_id:3} | UPLOAD   | {e}")
-                await event.respond(
-                    f"❌ **File Not Found** [`{task_id}`]\n`{filename}`"
+                    progress_callback=progress,
                 )
 
-            except Exception as e:
-                logger.exception(f"Task {task_id:3} | UPLOAD   | Error: {filename}")
-                await event.respond(
-                    f"❌ **Upload Failed** [`{task_id}`]\nError: `{str(e)[:200]}`"
-                )
-
-            finally:
-                # Cleanup: thumbnail, optimized file, then original
-                await file_manager.cleanup_files(
-                    thumb_path,
-                    optimized_path if optimized_path != original_path else None,
-                    original_path,
-                )
-                await task_manager.remove_task(task_id)
+            logger.info(f"{prefix} Success: {filename}")
+
+            await event.respond(
+                f"✅ **Upload Complete** [`{task_id}`]\n"
+                f"📄 File: `{filename}`\n"
+                f"📺 Resolution: `{width}x{height}`\n"
+                f"⏱️ Duration: `{duration}s`\n"
+                f"🎬 Streaming: `Enabled`\n"
+                f"🔧 Optimized: `{'Yes' if optimized else 'No'}`"
+            )
+
+        except FileNotFoundError as e:
+            logger.error(f"{prefix} {e}")
+            await event.respond(f"❌ **File Not Found** [`{task_id}`]\n`{filename}`")
+
+        except Exception as e:
+            logger.exception(f"{prefix} Error: {filename}")
+            err = str(e)[:200]
+            await event.respond(f"❌ **Upload Failed** [`{task_id}`]\nError: `{err}`")
+
+        finally:
+            # Cleanup: thumbnail, optimized file, then original
+            await file_manager.cleanup_files(
+                thumb_path,
+                optimized_path if optimized_path != original_path else None,
+                original_path,
+            )
+            task_manager.remove_task(task_id)